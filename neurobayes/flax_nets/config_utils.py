@@ -1,8 +1,10 @@
-from typing import Dict, List
+from typing import Dict, List, Union, Tuple
 from functools import singledispatch
+import jax.numpy as jnp
+import flax.linen as nn
 
-from .convnet import FlaxConvNet, FlaxConvNet2Head
-from .mlp import FlaxMLP, FlaxMLP2Head
+from .convnet import FlaxConvNet, FlaxConvNet2Head, ConvLayerModule
+from .mlp import FlaxMLP, FlaxMLP2Head, MLPLayerModule
 from .configs import extract_mlp_configs, extract_convnet_configs, extract_mlp2head_configs, extract_convnet2head_configs
 
 @singledispatch
@@ -29,4 +31,35 @@ def _(net: FlaxConvNet, probabilistic_layers: List[str] = None,
 @extract_configs.register
 def _(net: FlaxConvNet2Head, probabilistic_layers: List[str] = None, 
       num_probabilistic_layers: int = None) -> List[Dict]:
-    return extract_convnet2head_configs(net, probabilistic_layers, num_probabilistic_layers)
\ No newline at end of file
+    return extract_convnet2head_configs(net, probabilistic_layers, num_probabilistic_layers)
+
+
+def layer_from_config(config: Dict) -> Union[MLPLayerModule, ConvLayerModule]:
+    """Creates a single-layer module from a layer config produced by extract_configs"""
+    if config["layer_type"] == "conv":
+        return ConvLayerModule(
+            features=config['features'],
+            input_dim=config['input_dim'],
+            kernel_size=config['kernel_size'],
+            activation=config['activation'],
+            layer_name=config['layer_name'])
+    return MLPLayerModule(
+        features=config['features'],
+        activation=config['activation'],
+        layer_name=config['layer_name'])
+
+
+def sequential_from_configs(configs: List[Dict], params: Dict[str, Dict[str, jnp.ndarray]]
+                            ) -> Tuple[nn.Sequential, Dict]:
+    """
+    Stacks the layers described by configs into a single nn.Sequential module
+    (flattening the inputs when going from conv to fully-connected layers)
+    and arranges their flat per-layer params to match the Sequential structure.
+    """
+    layers, seq_params = [], {}
+    for i, config in enumerate(configs):
+        if i > 0 and configs[i-1]["layer_type"] == "conv" and config["layer_type"] != "conv":
+            layers.append(lambda x: x.reshape((x.shape[0], -1)))
+        seq_params[f"layers_{len(layers)}"] = {config['layer_name']: params[config['layer_name']]}
+        layers.append(layer_from_config(config))
+    return nn.Sequential(layers), {"params": seq_params}
@@ -7,7 +7,7 @@ import optax
 from functools import partial
 from tqdm import tqdm
 
-from ..utils.utils import split_in_batches
+from ..utils.utils import split_in_batches, to_default_float
 
 
 class TrainState(train_state.TrainState):
@@ -123,9 +123,9 @@ class DeterministicNN:
         return self._predict(self.state, X)
     
     def set_data(self, X: jnp.ndarray, y: jnp.ndarray = None)  -> jnp.ndarray:
-        X = X if X.ndim > 1 else X[:, None]
+        X = to_default_float(X if X.ndim > 1 else X[:, None])
         if y is not None:
-            y = y[:, None] if y.ndim < 2 else y
+            y = to_default_float(y[:, None] if y.ndim < 2 else y)
             return X, y
         return X
     
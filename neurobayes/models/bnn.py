@@ -1,15 +1,19 @@
-from typing import Dict, Tuple, Optional, Union, List, Type
+from typing import Dict, Tuple, Optional, Union, List, Type, Callable, Any
 import jax
 import jax.random as jra
 import jax.numpy as jnp
 import flax
+import optax
 
 import numpyro
 import numpyro.distributions as dist
-from numpyro.infer import MCMC, NUTS, init_to_median, Predictive
+from numpyro import handlers
+from numpyro.infer import MCMC, NUTS, init_to_median, init_to_value
+from numpyro.infer.util import initialize_model
 from numpyro.contrib.module import random_flax_module
 
-from ..utils import put_on_device, flatten_params_dict
+from ..utils import put_on_device, flatten_params_dict, map_in_batches, streaming_mean_and_var
+from ..utils import infer_chain_method, pmap_vectorized, to_default_float
 
 
 class BNN:
@@ -40,6 +44,9 @@ class BNN:
         self.nn = architecture
         self.noise_prior = noise_prior
         self.pretrained_priors = pretrained_priors
+        # Flatten pretrained weights once instead of at every model call
+        self._pretrained_priors = (flatten_params_dict(pretrained_priors)
+                                   if pretrained_priors is not None else None)
 
     def model(self,
               X: jnp.ndarray,
@@ -48,21 +55,11 @@ class BNN:
               **kwargs) -> None:
         """BNN model"""
 
-        pretrained_priors = (flatten_params_dict(self.pretrained_priors) 
-                           if self.pretrained_priors is not None else None)
-        
-        def prior(name, shape):
-            if pretrained_priors is not None:
-                param_path = name.split('.')
-                layer_name = param_path[-2]
-                param_type = param_path[-1]  # kernel or bias
-                return dist.Normal(pretrained_priors[layer_name][param_type], priors_sigma)
-            return dist.Normal(0., priors_sigma)
-        
         input_shape = X.shape[1:] if X.ndim > 2 else (X.shape[-1],)
 
         net = random_flax_module(
-            "nn", self.nn, input_shape=(1, *input_shape), prior=prior)
+            "nn", self.nn, input_shape=(1, *input_shape),
+            prior=self._get_prior(priors_sigma))
 
         # Pass inputs through a NN with the sampled parameters
         mu = numpyro.deterministic("mu", net(X))
@@ -70,16 +67,36 @@ class BNN:
         # Sample noise
         sig = self.sample_noise()
 
-        # Score against the observed data points
-        numpyro.sample("y", dist.Normal(mu, sig), obs=y)
+        # Score against the observed data points (target dimensions form a single event)
+        with numpyro.plate("data", X.shape[0]):
+            numpyro.sample("y", dist.Normal(mu, sig).to_event(1), obs=y)
+
+    def _get_prior(self, priors_sigma: float) -> Callable:
+        """
+        Returns a prior for random_flax_module, centered at the pretrained weights if provided
+        """
+        def prior(name, shape):
+            if self._pretrained_priors is not None:
+                param_path = name.split('.')
+                layer_name = param_path[-2]
+                param_type = param_path[-1]  # kernel or bias
+                return dist.Normal(self._pretrained_priors[layer_name][param_type], priors_sigma)
+            return dist.Normal(0., priors_sigma)
+        return prior
 
     def fit(self, X: jnp.ndarray, y: jnp.ndarray,
             num_warmup: int = 2000, num_samples: int = 2000,
-            num_chains: int = 1, chain_method: str = 'sequential',
+            num_chains: int = 1, chain_method: Optional[str] = None,
             priors_sigma: Optional[float] = 1.0,
             progress_bar: bool = True, device: Optional[str] = None,
             rng_key: Optional[jnp.array] = None,
             extra_fields: Optional[Tuple[str, ...]] = (),
+            map_init: bool = False,
+            init_values: Optional[Dict[str, jnp.ndarray]] = None,
+            dense_mass: bool = False,
+            max_tree_depth: int = 10,
+            target_accept_prob: float = 0.8,
+            find_heuristic_step_size: bool = False
             ) -> None:
         """
         Run No-U-Turn Sampler (NUTS) to infer parameters of the Bayesian Neural Network.
@@ -94,7 +111,10 @@ class BNN:
             num_samples (int, optional): Number of NUTS samples to draw. Defaults to 2000.
             num_chains (int, optional): Number of NUTS chains to run. Defaults to 1.
             chain_method (str, optional): Method for running chains: 'sequential', 'parallel', 
-                or 'vectorized'. Defaults to 'sequential'.
+                'vectorized', or 'pmap_vectorized' (chains split between devices and vectorized
+                on each device). Defaults to None, meaning 'vectorized' on a single GPU/TPU,
+                'pmap_vectorized' on multiple GPUs/TPUs, 'parallel' on CPU if there is a CPU
+                device per chain, and 'sequential' otherwise.
             priors_sigma (float, optional): Standard deviation for default or pretrained priors. 
                 Defaults to 1.0.
             progress_bar (bool, optional): Whether to show a progress bar. Defaults to True.
@@ -103,6 +123,21 @@ class BNN:
             rng_key (jnp.ndarray, optional): Random number generator key. If None, uses a default key.
             extra_fields (Tuple[str, ...], optional): Extra fields (e.g. 'accept_prob') to collect 
                 during the MCMC run. Accessible via model.mcmc.get_extra_fields() after training.
+            map_init (bool, optional): Whether to start the NUTS chains from a short MAP fit
+                of the model parameters (see .get_map_init_values()) instead of the median of
+                the prior samples. Note that all chains then start from the same point.
+                Defaults to False.
+            init_values (Dict[str, jnp.ndarray], optional): Initial values for the NUTS chains
+                keyed by the sample site names. Sites that are not listed are initialized uniformly
+                in the unconstrained space. Takes precedence over map_init. Defaults to None.
+            dense_mass (bool, optional): Whether to adapt a dense (full-rank) mass matrix instead
+                of a diagonal one. Helps with strongly correlated posteriors. Defaults to False.
+            max_tree_depth (int, optional): Maximum depth of the NUTS binary tree, i.e. at most
+                2**max_tree_depth leapfrog steps per iteration. Defaults to 10.
+            target_accept_prob (float, optional): Target acceptance probability for the step size
+                adaptation. Defaults to 0.8.
+            find_heuristic_step_size (bool, optional): Whether to search for a reasonable initial
+                step size before the warmup. Defaults to False.
 
         Returns:
             None: The method updates the model's internal state but does not return a value.
@@ -112,11 +147,27 @@ class BNN:
             of the model and can be accessed via .get_samples() method for further analysis.
         """
         key = rng_key if rng_key is not None else jra.PRNGKey(0)
+        if chain_method is None:
+            chain_method = infer_chain_method(num_chains, device)
+        if chain_method == "pmap_vectorized":
+            chain_method = pmap_vectorized(num_chains, device)
+            # numpyro cannot show a progress bar for chains mapped with a custom transform
+            progress_bar = progress_bar and isinstance(chain_method, str)
         X, y = self.set_data(X, y)
         X, y = put_on_device(device, X, y)
-        
-        init_strategy = init_to_median(num_samples=10)
-        kernel = NUTS(self.model, init_strategy=init_strategy)
+        if init_values is None and map_init:
+            key, map_key = jra.split(key)
+            init_values = self.get_map_init_values(X, y, priors_sigma, rng_key=map_key)
+
+        if init_values:
+            init_strategy = init_to_value(values=init_values)
+        else:
+            init_strategy = init_to_median(num_samples=10)
+        kernel = NUTS(
+            self._get_sampling_model(), init_strategy=init_strategy,
+            dense_mass=dense_mass, max_tree_depth=max_tree_depth,
+            target_accept_prob=target_accept_prob,
+            find_heuristic_step_size=find_heuristic_step_size)
         self.mcmc = MCMC(
             kernel,
             num_warmup=num_warmup,
@@ -124,12 +175,96 @@ class BNN:
             num_chains=num_chains,
             chain_method=chain_method,
             progress_bar=progress_bar,
-            jit_model_args=False
+            jit_model_args=True
         )
         self.mcmc.run(
             key, X, y,
             priors_sigma,
             extra_fields=extra_fields)
+        # Keep the model arguments to be able to continue sampling later
+        self._mcmc_args = (X, y, priors_sigma)
+        # Samples from earlier runs, collected by continue_sampling
+        self._previous_samples = None
+        # The compiled predictive functions may depend on the fitted model state
+        self._jit_predict = None
+        self._jit_sample_from_posterior = None
+
+    def continue_sampling(self,
+                          num_samples: Optional[int] = None,
+                          progress_bar: bool = True,
+                          rng_key: Optional[jnp.ndarray] = None,
+                          extra_fields: Optional[Tuple[str, ...]] = ()
+                          ) -> None:
+        """
+        Draw more NUTS samples starting from the last state of the previous run
+        and reusing the step size and mass matrix adapted during its warmup,
+        so that the warmup phase is not repeated. The new samples are appended
+        to the ones from the previous run(s).
+
+        Args:
+            num_samples (int, optional): Number of NUTS samples to draw.
+                Defaults to the number of samples in the previous run.
+            progress_bar (bool, optional): Whether to show a progress bar. Defaults to True.
+            rng_key (jnp.ndarray, optional): Random number generator key.
+                If None, continues from the random state of the previous run.
+            extra_fields (Tuple[str, ...], optional): Extra fields (e.g. 'accept_prob') to collect
+                during the MCMC run. Defaults to ().
+        """
+        if getattr(self, "mcmc", None) is None:
+            raise ValueError("The model must be trained with .fit() before continuing sampling")
+        last_state = self.mcmc.last_state
+        key = rng_key if rng_key is not None else last_state.rng_key
+        if num_samples is not None:
+            self.mcmc.num_samples = num_samples
+        self.mcmc.progress_bar = progress_bar and isinstance(self.mcmc.chain_method, str)
+        self.mcmc.post_warmup_state = last_state
+        self._previous_samples = self.get_samples(chain_dim=True)
+        self.mcmc.run(key, *self._mcmc_args, extra_fields=extra_fields)
+
+    def get_map_init_values(self,
+                            X: jnp.ndarray,
+                            y: jnp.ndarray,
+                            priors_sigma: float = 1.0,
+                            num_steps: int = 200,
+                            learning_rate: float = 0.01,
+                            rng_key: Optional[jnp.ndarray] = None
+                            ) -> Dict[str, jnp.ndarray]:
+        """
+        Finds a MAP estimate of the model parameters with a short Adam run on the
+        potential energy (negative log joint) of the model, compiled as a single
+        jax.lax.scan, and returns it keyed by the NUTS sample site names
+        """
+        key = rng_key if rng_key is not None else jra.PRNGKey(0)
+        model_args = (X, y, priors_sigma)
+        model_info = initialize_model(
+            key, self._get_sampling_model(), model_args=model_args, dynamic_args=True)
+        potential_fn_gen, postprocess_fn_gen = model_info[1], model_info[2]
+        optimizer = optax.adam(learning_rate)
+
+        @jax.jit
+        def run_map(params, *model_args):
+            potential_fn = potential_fn_gen(*model_args)
+
+            def step(carry, _):
+                params, opt_state = carry
+                grads = jax.grad(potential_fn)(params)
+                updates, opt_state = optimizer.update(grads, opt_state)
+                return (optax.apply_updates(params, updates), opt_state), None
+
+            (params, _), _ = jax.lax.scan(
+                step, (params, optimizer.init(params)), None, length=num_steps)
+            return postprocess_fn_gen(*model_args)(params)
+
+        return run_map(model_info[0].z, *model_args)
+
+    def _get_sampling_model(self) -> Callable:
+        """
+        Returns the model as seen by the sampler. Deterministic sites (e.g. "mu") are
+        only needed at prediction time, so they are not recomputed and stored for every
+        posterior sample
+        """
+        return handlers.block(
+            self.model, hide_fn=lambda site: site["type"] == "deterministic")
 
     def sample_noise(self) -> jnp.ndarray:
         """
@@ -139,7 +274,15 @@ class BNN:
     
     def get_samples(self, chain_dim: bool = False) -> Dict[str, jnp.ndarray]:
         """Get posterior samples (after running the MCMC chains)"""
-        return self.mcmc.get_samples(group_by_chain=chain_dim)
+        if getattr(self, "_previous_samples", None) is None:
+            return self.mcmc.get_samples(group_by_chain=chain_dim)
+        # Extend the samples from earlier runs along the sample axis of each chain
+        samples = jax.tree_util.tree_map(
+            lambda prev, new: jnp.concatenate([prev, new], axis=1),
+            self._previous_samples, self.mcmc.get_samples(group_by_chain=True))
+        if chain_dim:
+            return samples
+        return jax.tree_util.tree_map(lambda x: x.reshape(-1, *x.shape[2:]), samples)
 
     def predict(self,
                 X_new: jnp.ndarray,
@@ -159,8 +302,8 @@ class BNN:
                 the last MCMC run by default.
             device (str, optional): The device to perform computation on ('cpu', 'gpu'). 
                 If None, uses the JAX default device.
-            rng_key (jnp.ndarray, optional): Random number generator key for JAX operations. 
-                If None, a default key is used.
+            rng_key (jnp.ndarray, optional): Not used, as the predictive moments are computed
+                in closed form. Kept for backward compatibility.
 
         Returns:
             Tuple[jnp.ndarray, jnp.ndarray]: A tuple containing:
@@ -171,17 +314,74 @@ class BNN:
         """
         X_new = self.set_data(X_new)
 
-        if rng_key is None:
-            rng_key = jra.PRNGKey(0)
         if samples is None:
             samples = self.get_samples(chain_dim=False)
         X_new, samples = put_on_device(device, X_new, samples)
+        return self._get_jit_predict()(X_new, samples)
+
+    def predict_in_batches(self,
+                           X_new: jnp.ndarray,
+                           batch_size: int = 200,
+                           samples: Optional[Dict[str, jnp.ndarray]] = None,
+                           device: Optional[str] = None,
+                           rng_key: Optional[jnp.ndarray] = None
+                           ) -> Tuple[jnp.ndarray, jnp.ndarray]:
+        """
+        Make prediction in batches (to avoid memory overflow) at X_new points.
+        The batches are evaluated on the device with jax.lax.map and the results
+        are moved to the host in a single transfer. See .predict() for the description
+        of the remaining arguments.
+        """
+        X_new = self.set_data(X_new)
+
+        if samples is None:
+            samples = self.get_samples(chain_dim=False)
+        X_new, samples = put_on_device(device, X_new, samples)
+
+        mean, var = map_in_batches(
+            lambda x: self._vmap_predict(x, samples), X_new, batch_size)
+        return jax.device_put((mean, var), jax.devices("cpu")[0])
+
+    def _get_jit_predict(self):
+        """
+        Returns jax.jit-compiled ._vmap_predict. It is built once per fit and reused,
+        so repeated predictions on inputs of the same shape are not re-traced
+        """
+        if getattr(self, "_jit_predict", None) is None:
+            self._jit_predict = jax.jit(self._vmap_predict)
+        return self._jit_predict
+
+    def _vmap_predict(self,
+                      X_new: jnp.ndarray,
+                      samples: Dict[str, jnp.ndarray]
+                      ) -> Tuple[jnp.ndarray, jnp.ndarray]:
+        """
+        Computes posterior predictive mean and variance at X_new by streaming
+        over the posterior samples, without materializing per-sample predictions.
+        The predictive variance is obtained in closed form as the variance of the
+        NN outputs across the posterior samples plus the expected noise variance,
+        instead of a Monte Carlo estimate from the sampled observations.
+        """
+        def predict_single(params):
+            # The observation site is still sampled but not used, so it is pruned by XLA
+            pred = self._trace_model(jra.PRNGKey(0), X_new, params)
+            return pred["mu"]["value"], jnp.square(pred["sig"]["value"])
+
+        (posterior_mean, noise_var), (mu_var, _) = streaming_mean_and_var(
+            predict_single, samples)
+        return posterior_mean, mu_var + noise_var
 
-        predictions = self.sample_from_posterior(
-            rng_key, X_new, samples, return_sites=["mu", "y"])
-        posterior_mean = predictions["mu"].mean(0)
-        posterior_var = predictions["y"].var(0)
-        return posterior_mean, posterior_var
+    def _trace_model(self,
+                     rng_key: jnp.ndarray,
+                     X_new: jnp.ndarray,
+                     params: Dict[str, jnp.ndarray]
+                     ) -> Dict[str, Dict[str, Any]]:
+        """
+        Runs the model as is (i.e. on the model inputs) for a single set of
+        parameters and returns its trace (the sites keyed by their names)
+        """
+        model = handlers.seed(handlers.condition(self.model, params), rng_key)
+        return handlers.trace(model).get_trace(X_new)
 
     def sample_from_posterior(self,
                               rng_key: jnp.ndarray,
@@ -189,17 +389,56 @@ class BNN:
                               samples: Dict[str, jnp.ndarray],
                               return_sites: Optional[List[str]] = None
                               ) -> jnp.ndarray:
-        """Sample from posterior distribution at new inputs X_new"""
-        predictive = Predictive(
-            self.model, samples,
-            return_sites=return_sites
-        )
-        return predictive(rng_key, X_new)
+        """
+        Sample from posterior distribution at new inputs X_new. Returns the values
+        at return_sites, or at the sites that are not in the samples (e.g. observations)
+        and at the deterministic sites if return_sites is None
+        """
+        if return_sites is not None:
+            return_sites = tuple(return_sites)
+        return self._get_jit_sample_from_posterior()(rng_key, X_new, samples, return_sites)
+
+    def _get_jit_sample_from_posterior(self):
+        """
+        Returns jax.jit-compiled ._vmap_sample_from_posterior. It is built once per fit
+        and reused, so repeated sampling at inputs of the same shape is not re-traced
+        """
+        if getattr(self, "_jit_sample_from_posterior", None) is None:
+            self._jit_sample_from_posterior = jax.jit(
+                self._vmap_sample_from_posterior, static_argnums=3)
+        return self._jit_sample_from_posterior
+
+    def _vmap_sample_from_posterior(self,
+                                    rng_key: jnp.ndarray,
+                                    X_new: jnp.ndarray,
+                                    samples: Dict[str, jnp.ndarray],
+                                    return_sites: Optional[Tuple[str, ...]] = None
+                                    ) -> Dict[str, jnp.ndarray]:
+        """
+        Runs the model at X_new for each set of posterior parameters. The samples are
+        processed one at a time with jax.lax.map, so that the memory footprint does not
+        grow with the number of posterior samples
+        """
+        num_samples = len(next(iter(samples.values())))
+
+        # Per-sample keys are derived inside the mapped function
+        # instead of splitting the key into a (num_samples, 2) array upfront
+        def sample_single(args):
+            idx, params = args
+            model_trace = self._trace_model(jra.fold_in(rng_key, idx), X_new, params)
+            sites = return_sites or [
+                name for name, site in model_trace.items()
+                if (site["type"] == "sample" and name not in params)
+                or site["type"] == "deterministic"
+            ]
+            return {name: model_trace[name]["value"] for name in sites}
+
+        return jax.lax.map(sample_single, (jnp.arange(num_samples), samples))
 
     def set_data(self, X: jnp.ndarray, y: Optional[jnp.ndarray] = None
                  ) -> Union[Tuple[jnp.ndarray], jnp.ndarray]:
-        X = X if X.ndim > 1 else X[:, None]
+        X = to_default_float(X if X.ndim > 1 else X[:, None])
         if y is not None:
-            y = y[:, None] if y.ndim < 2 else y
+            y = to_default_float(y[:, None] if y.ndim < 2 else y)
             return X, y
         return X
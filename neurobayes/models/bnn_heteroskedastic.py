@@ -7,7 +7,7 @@ import numpyro.distributions as dist
 from numpyro.contrib.module import random_flax_module
 
 from .bnn import BNN
-from ..utils.utils import put_on_device
+from ..utils.utils import put_on_device, streaming_mean_and_var
 
 
 class HeteroskedasticBNN(BNN):
@@ -29,29 +29,15 @@ class HeteroskedasticBNN(BNN):
     def model(self,
               X: jnp.ndarray,
               y: jnp.ndarray = None,
-              pretrained_priors: Dict = None,
               priors_sigma: float = 1.0,
               **kwargs) -> None:
         """Heteroskedastic BNN model"""
 
-        if self.pretrained_priors is not None:
-            pretrained_priors = {}
-            for module_dict in self.pretrained_priors.values():
-                pretrained_priors.update(module_dict)
-            self.pretrained_priors = pretrained_priors
-
-        def prior(name, shape):
-            if self.pretrained_priors is not None:
-                param_path = name.split('.')
-                layer_name = param_path[0]
-                param_type = param_path[-1]  # kernel or bias
-                return dist.Normal(self.pretrained_priors[layer_name][param_type], priors_sigma)
-            return dist.Normal(0., priors_sigma)
-
         input_shape = X.shape[1:] if X.ndim > 2 else (X.shape[-1],)
 
         net = random_flax_module(
-            "nn", self.nn, input_shape=(1, *input_shape), prior=prior)
+            "nn", self.nn, input_shape=(1, *input_shape),
+            prior=self._get_prior(priors_sigma))
 
         # Pass inputs through a NN with the sampled parameters
         mu, sig = net(X)
@@ -59,8 +45,9 @@ class HeteroskedasticBNN(BNN):
         mu = numpyro.deterministic("mu", mu)
         sig = numpyro.deterministic("sig", sig)
 
-        # Score against the observed data points
-        numpyro.sample("y", dist.Normal(mu, sig), obs=y)
+        # Score against the observed data points (target dimensions form a single event)
+        with numpyro.plate("data", X.shape[0]):
+            numpyro.sample("y", dist.Normal(mu, sig).to_event(1), obs=y)
 
     def predict_noise(self, X_new: jnp.ndarray,
                       device: Optional[str] = None) -> jnp.ndarray:
@@ -68,6 +55,14 @@ class HeteroskedasticBNN(BNN):
         X_new = self.set_data(X_new)
         samples = self.get_samples()
         X_new, samples = put_on_device(device, X_new, samples)
-        pred = self.sample_from_posterior(
-            jra.PRNGKey(0), X_new, samples, return_sites=['sig'])
-        return pred['sig'].mean(0)
+        return self._vmap_predict_noise(X_new, samples)
+
+    def _vmap_predict_noise(self,
+                            X_new: jnp.ndarray,
+                            samples: Dict[str, jnp.ndarray]
+                            ) -> jnp.ndarray:
+        """Averages the predicted noise at X_new by streaming over the posterior samples"""
+        noise_mean, _ = streaming_mean_and_var(
+            lambda params: self._trace_model(jra.PRNGKey(0), X_new, params)["sig"]["value"],
+            samples)
+        return noise_mean
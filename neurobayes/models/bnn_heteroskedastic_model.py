@@ -42,5 +42,6 @@ class VarianceModelHeteroskedasticBNN(HeteroskedasticBNN):
         var_params = self.variance_model_prior()
         sig = numpyro.deterministic("sig", self.variance_model(X, var_params))
 
-        # Score against the observed data points
-        numpyro.sample("y", dist.Normal(mu, sig), obs=y)
+        # Score against the observed data points (target dimensions form a single event)
+        with numpyro.plate("data", X.shape[0]):
+            numpyro.sample("y", dist.Normal(mu, sig).to_event(1), obs=y)
@@ -8,7 +8,8 @@ import numpyro.distributions as dist
 from numpyro.infer import MCMC, NUTS, init_to_median
 
 from ..utils.priors import GPPriors
-from ..utils.utils import put_on_device, split_in_batches
+from ..utils.utils import put_on_device, map_in_batches, streaming_mean_and_var, infer_chain_method, pmap_vectorized
+from ..utils.utils import to_default_float
 
 kernel_fn_type = Callable[[jnp.ndarray, jnp.ndarray, Dict[str, jnp.ndarray], jnp.ndarray],  jnp.ndarray]
 
@@ -54,7 +55,7 @@ class GP:
             num_warmup: int = 2000,
             num_samples: int = 2000,
             num_chains: int = 1,
-            chain_method: str = "sequential",
+            chain_method: Optional[str] = None,
             progress_bar: bool = True,
             print_summary: bool = True,
             device: str = None,
@@ -70,7 +71,11 @@ class GP:
             num_warmup: number of HMC warmup states
             num_samples: number of HMC samples
             num_chains: number of HMC chains
-            chain_method: 'sequential', 'parallel' or 'vectorized'
+            chain_method:
+                'sequential', 'parallel', 'vectorized' or 'pmap_vectorized' (chains split between
+                devices and vectorized on each device). Defaults to None, meaning 'vectorized' on
+                a single GPU/TPU, 'pmap_vectorized' on multiple GPUs/TPUs, 'parallel' on CPU if there
+                is a CPU device per chain, and 'sequential' otherwise
             progress_bar: show progress bar
             print_summary: print summary at the end of sampling
             device:
@@ -82,6 +87,12 @@ class GP:
                 The extra fields are accessible from model.mcmc.get_extra_fields() after model training.
         """
         key = rng_key if rng_key is not None else jra.PRNGKey(0)
+        if chain_method is None:
+            chain_method = infer_chain_method(num_chains, device)
+        if chain_method == "pmap_vectorized":
+            chain_method = pmap_vectorized(num_chains, device)
+            # numpyro cannot show a progress bar for chains mapped with a custom transform
+            progress_bar = progress_bar and isinstance(chain_method, str)
         X, y = self.set_data(X, y)
         X, y = put_on_device(device, X, y)
         self.X_train = X
@@ -96,7 +107,7 @@ class GP:
             num_chains=num_chains,
             chain_method=chain_method,
             progress_bar=progress_bar,
-            jit_model_args=False,
+            jit_model_args=True,
         )
         self.mcmc.run(key, X, y, extra_fields=extra_fields)
 
@@ -163,18 +174,28 @@ class GP:
         """
         X_new = self.set_data(X_new)
         samples = self.get_samples(chain_dim=False)
-        self.X, self.y, X_new, samples = put_on_device(
+        self.X_train, self.y_train, X_new, samples = put_on_device(
             device, self.X_train, self.y_train, X_new, samples)
+        return self._vmap_predict(X_new, samples, noiseless)
 
-        predictive = lambda p: self.compute_gp_posterior(
-            X_new, self.X_train, self.y_train, p, noiseless)
-        # Compute predictive mean and covariance for all HMC samples
-        mu_all, cov_all = vmap(predictive)(samples)
-        # Calculate the average of the means
-        mean_predictions = mu_all.mean(axis=0)
-        # Calculate the average within-model variance and variance of the means
-        average_within_model_variance = cov_all.mean(axis=0).diagonal()
-        variance_of_means = jnp.var(mu_all, axis=0)
+    def _vmap_predict(self,
+                      X_new: jnp.ndarray,
+                      samples: Dict[str, jnp.ndarray],
+                      noiseless: bool = True
+                      ) -> Tuple[jnp.ndarray, jnp.ndarray]:
+        """
+        Computes posterior predictive mean and variance at X_new
+        averaged over all the HMC samples. The moments are accumulated
+        on the device in a single pass over the samples, so that only
+        one predictive covariance matrix is held in memory at a time.
+        """
+        def predict_single(params):
+            mu, cov = self.compute_gp_posterior(
+                X_new, self.X_train, self.y_train, params, noiseless)
+            return mu, cov.diagonal()
+        # Average of the means and of the within-model variances, and variance of the means
+        (mean_predictions, average_within_model_variance), (variance_of_means, _) = (
+            streaming_mean_and_var(predict_single, samples))
         # Total predictive variance
         total_predictive_variance = average_within_model_variance + variance_of_means
 
@@ -189,14 +210,14 @@ class GP:
         Make prediction in batches (to avoid memory overflow) 
         at X_new points a trained GP model
         """
-        mean, var = [], []
-        for x in split_in_batches(X_new, batch_size):
-            mean_i, var_i = self.predict(x, noiseless, device)
-            mean_i = jax.device_put(mean_i, jax.devices("cpu")[0])
-            var_i = jax.device_put(var_i, jax.devices("cpu")[0])
-            mean.append(mean_i)
-            var.append(var_i)
-        return jnp.concatenate(mean), jnp.concatenate(var)
+        X_new = self.set_data(X_new)
+        samples = self.get_samples(chain_dim=False)
+        self.X_train, self.y_train, X_new, samples = put_on_device(
+            device, self.X_train, self.y_train, X_new, samples)
+        mean, var = map_in_batches(
+            lambda x: self._vmap_predict(x, samples, noiseless), X_new, batch_size)
+        # Single device-to-host transfer for all the batches
+        return jax.device_put((mean, var), jax.devices("cpu")[0])
 
     def draw_from_mvn(self,
                       rng_key: jnp.ndarray,
@@ -246,13 +267,16 @@ class GP:
         key = rng_key if rng_key is not None else jra.PRNGKey(0)
         X_new = self.set_data(X_new)
         samples = self.get_samples(chain_dim=False)
-        self.X, self.y, X_new, samples = put_on_device(
-            device, self.X, self.y, X_new, samples)
+        self.X_train, self.y_train, X_new, samples = put_on_device(
+            device, self.X_train, self.y_train, X_new, samples)
 
         num_samples = len(next(iter(samples.values())))
-        vmap_args = (jra.split(key, num_samples), samples)
-        predictive = lambda p1, p2: self.draw_from_mvn(p1, X_new, p2, n_draws, noiseless)
-        return vmap(predictive)(*vmap_args)
+        # Per-sample keys are derived inside the vmapped function
+        # instead of splitting the key into a (num_samples, 2) array upfront
+        def predictive(idx, params):
+            return self.draw_from_mvn(
+                jra.fold_in(key, idx), X_new, params, n_draws, noiseless)
+        return vmap(predictive)(jnp.arange(num_samples), samples)
 
     def get_samples(self, chain_dim: bool = False) -> Dict[str, jnp.ndarray]:
         """Get posterior samples (after running the MCMC chains)"""
@@ -260,9 +284,9 @@ class GP:
 
     def set_data(self, X: jnp.ndarray, y: Optional[jnp.ndarray] = None
                   ) -> Union[Tuple[jnp.ndarray], jnp.ndarray]:
-        X = X if X.ndim > 1 else X[:, None]
+        X = to_default_float(X if X.ndim > 1 else X[:, None])
         if y is not None:
-            return X, y.squeeze()
+            return X, to_default_float(y.squeeze())
         return X
 
     def print_summary(self) -> None:
@@ -3,15 +3,12 @@ import jax.numpy as jnp
 
 import numpyro
 import numpyro.distributions as dist
-from numpyro.contrib.module import random_flax_module
 
 from .bnn import BNN
+from .partial_bnn_base import PartialBNNMixin
 from ..flax_nets import FlaxMLP, FlaxConvNet
-from ..flax_nets import DeterministicNN
-from ..flax_nets import MLPLayerModule, ConvLayerModule, extract_configs
-from ..utils import flatten_params_dict
 
-class PartialBNN(BNN):
+class PartialBNN(PartialBNNMixin, BNN):
     """
     Partially stochastic (Bayesian) neural network
 
@@ -27,6 +24,10 @@ class PartialBNN(BNN):
             Names of neural network modules to be treated probabilistically
         noise_prior:
             Custom prior for observational noise distribution
+        deterministic_dtype:
+            Optional reduced-precision dtype (e.g. jnp.bfloat16) for evaluating the leading
+            deterministic layers. Their outputs are cast back to the default float type
+            before entering the probabilistic layers. Defaults to None (full precision).
     """
 
     def __init__(self,
@@ -34,73 +35,24 @@ class PartialBNN(BNN):
                  deterministic_weights: Optional[Dict[str, jnp.ndarray]] = None,
                  num_probabilistic_layers: int = None,
                  probabilistic_layer_names: List[str] = None,
-                 noise_prior: Optional[dist.Distribution] = None
+                 noise_prior: Optional[dist.Distribution] = None,
+                 deterministic_dtype: Optional[jnp.dtype] = None
                  ) -> None:
         super().__init__(None, noise_prior=noise_prior)
-        
-        self.deterministic_nn = deterministic_nn
-        self.deterministic_weights = deterministic_weights
+        self._set_layers(deterministic_nn, deterministic_weights, num_probabilistic_layers,
+                         probabilistic_layer_names, deterministic_dtype)
 
-        self.layer_configs = extract_configs(
-            deterministic_nn, probabilistic_layer_names, num_probabilistic_layers)
-    
     def model(self,
           X: jnp.ndarray,
           y: jnp.ndarray = None,
           priors_sigma: float = 1.0,
           **kwargs) -> None:
-        """Partial BNN model"""
-    
-        net = self.deterministic_nn
-        pretrained_priors = flatten_params_dict(self.deterministic_weights)
-        
-        def prior(name, shape):
-            param_path = name.split('.')
-            layer_name = param_path[0]
-            param_type = param_path[-1]  # kernel or bias
-            return dist.Normal(pretrained_priors[layer_name][param_type], priors_sigma)
-
-        current_input = X
-
-        # Track when we switch from conv to dense layers
-        last_conv_idx = max(
-            (i for i, c in enumerate(self.layer_configs) if c["layer_type"] == "conv"),
-            default=-1
-        )
-        
-        for idx, config in enumerate(self.layer_configs):
-            layer_name = config['layer_name']
-
-            # Flatten inputs after last conv layer
-            if idx > last_conv_idx and idx-1 == last_conv_idx:
-                current_input = current_input.reshape((current_input.shape[0], -1))
-
-            layer_cls = ConvLayerModule if config["layer_type"] == "conv" else MLPLayerModule
-            layer = layer_cls(
-                features=config['features'],
-                activation=config['activation'],
-                layer_name=layer_name,
-                **({"input_dim": config['input_dim'], 
-                    "kernel_size": config['kernel_size']} if config["layer_type"] == "conv" else {})
-            )
-            
-            if config['is_probabilistic']:
-                net = random_flax_module(
-                    layer_name, layer, 
-                    input_shape=(1, *current_input.shape[1:]),
-                    prior=prior
-                )
-                current_input = net(current_input)
-            else:
-                params = {
-                    "params": {
-                        layer_name: {
-                            "kernel": pretrained_priors[layer_name]["kernel"],
-                            "bias": pretrained_priors[layer_name]["bias"]
-                        }
-                    }
-                }
-                current_input = layer.apply(params, current_input)
+        """
+        Partial BNN model. Takes the output of the leading deterministic
+        layers (see .deterministic_features()) as its input.
+        """
+        current_input = self._apply_layers(
+            X, self._num_prefix_layers, len(self.layer_configs), priors_sigma)
 
         # Register final output
         mu = numpyro.deterministic("mu", current_input)
@@ -108,18 +60,22 @@ class PartialBNN(BNN):
         # Sample noise
         sig = self.sample_noise()
 
-        # Score against the observed data points
-        numpyro.sample("y", dist.Normal(mu, sig), obs=y)
+        # Score against the observed data points (target dimensions form a single event)
+        with numpyro.plate("data", X.shape[0]):
+            numpyro.sample("y", dist.Normal(mu, sig).to_event(1), obs=y)
 
     def fit(self, X: jnp.ndarray, y: jnp.ndarray,
             num_warmup: int = 2000, num_samples: int = 2000,
-            num_chains: int = 1, chain_method: str = 'sequential',
+            num_chains: int = 1, chain_method: Optional[str] = None,
             sgd_epochs: Optional[int] = None, sgd_lr: Optional[float] = 0.01,
             sgd_batch_size: Optional[int] = None, sgd_wa_epochs: Optional[int] = 10,
             map_sigma: float = 1.0, priors_sigma: float = 1.0,
             progress_bar: bool = True, device: str = None,
             rng_key: Optional[jnp.array] = None,
-            extra_fields: Optional[Tuple[str, ...]] = ()
+            extra_fields: Optional[Tuple[str, ...]] = (),
+            map_init: bool = True, init_values: Optional[Dict[str, jnp.ndarray]] = None,
+            dense_mass: bool = False, max_tree_depth: int = 10,
+            target_accept_prob: float = 0.8, find_heuristic_step_size: bool = False
             ) -> None:
         """
         Infer parameters of the partial BNN
@@ -134,7 +90,10 @@ class PartialBNN(BNN):
             num_samples (int, optional): Number of NUTS samples to draw. Defaults to 2000.
             num_chains (int, optional): Number of NUTS chains to run. Defaults to 1.
             chain_method (str, optional): Method for running chains: 'sequential', 'parallel', 
-                or 'vectorized'. Defaults to 'sequential'.
+                'vectorized', or 'pmap_vectorized' (chains split between devices and vectorized
+                on each device). Defaults to None, meaning 'vectorized' on a single GPU/TPU,
+                'pmap_vectorized' on multiple GPUs/TPUs, 'parallel' on CPU if there is a CPU
+                device per chain, and 'sequential' otherwise.
             sgd_epochs (Optional[int], optional): Number of SGD training epochs for deterministic NN.
                 Defaults to 500 (if no pretrained weights are provided).
             sgd_lr (float, optional): SGD learning rate. Defaults to 0.01.
@@ -150,17 +109,28 @@ class PartialBNN(BNN):
             rng_key (Optional[jnp.ndarray], optional): Random number generator key. Defaults to None.
             extra_fields (Optional[Tuple[str, ...]], optional): Extra fields to collect during the MCMC run. 
                 Defaults to ().
+            map_init (bool, optional): Whether to start the NUTS chains from the deterministic (MAP)
+                weights of the probabilistic layers instead of the median of the prior samples.
+                Note that all chains then start from the same point. Defaults to True.
+            init_values (Dict[str, jnp.ndarray], optional): Initial values for the NUTS chains
+                keyed by the sample site names. Takes precedence over map_init. Defaults to None.
+            dense_mass (bool, optional): Adapt a dense (full-rank) mass matrix instead of a diagonal one.
+                Defaults to False.
+            max_tree_depth (int, optional): Maximum depth of the NUTS binary tree. Defaults to 10.
+            target_accept_prob (float, optional): Target acceptance probability for the step size
+                adaptation. Defaults to 0.8.
+            find_heuristic_step_size (bool, optional): Search for a reasonable initial step size
+                before the warmup. Defaults to False.
         """
+        X, y = self.set_data(X, y)
         if not self.deterministic_weights:
-            print("Training deterministic NN...")
-            X, y = self.set_data(X, y)
-            det_nn = DeterministicNN(
-                self.deterministic_nn,
-                input_shape = X.shape[1:] if X.ndim > 2 else (X.shape[-1],), # different input shape for ConvNet and MLP
-                learning_rate=sgd_lr, swa_epochs=sgd_wa_epochs, sigma=map_sigma)
-            det_nn.train(X, y, 500 if sgd_epochs is None else sgd_epochs, sgd_batch_size)
-            self.deterministic_weights = det_nn.state.params
-            print("Training partially Bayesian NN")
+            self._train_deterministic_nn(
+                X, y, sgd_epochs, sgd_lr, sgd_batch_size, sgd_wa_epochs, map_sigma)
+        X = self.deterministic_features(X)
         super().fit(
             X, y, num_warmup, num_samples, num_chains, chain_method,
-            priors_sigma, progress_bar, device, rng_key, extra_fields)
+            priors_sigma, progress_bar, device, rng_key, extra_fields,
+            map_init=map_init, init_values=init_values,
+            dense_mass=dense_mass, max_tree_depth=max_tree_depth,
+            target_accept_prob=target_accept_prob,
+            find_heuristic_step_size=find_heuristic_step_size)
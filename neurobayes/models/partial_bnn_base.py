@@ -0,0 +1,187 @@
+from typing import Dict, Optional, List
+import jax
+import jax.numpy as jnp
+import flax
+
+import numpyro.distributions as dist
+from numpyro.contrib.module import random_flax_module
+
+from ..flax_nets import DeterministicNN
+from ..flax_nets import extract_configs, layer_from_config, sequential_from_configs
+from ..utils import flatten_params_dict, get_init_vals_dict
+
+
+class PartialBNNMixin:
+    """
+    Layer bookkeeping, pretrained priors and the deterministic prefix shared by the
+    partially Bayesian models. It is combined with a BNN class (e.g. PartialBNN(PartialBNNMixin, BNN)),
+    which provides the sampling and prediction logic, while the subclass defines the model.
+    """
+
+    # Number of output head layers at the end of the network that are always applied
+    # inside the model, even if they are deterministic
+    _num_head_layers = 0
+    # Loss used to train the deterministic NN if no pretrained weights are provided
+    _deterministic_loss = 'homoskedastic'
+
+    def _set_layers(self,
+                    deterministic_nn: flax.linen.Module,
+                    deterministic_weights: Optional[Dict[str, jnp.ndarray]],
+                    num_probabilistic_layers: Optional[int],
+                    probabilistic_layer_names: Optional[List[str]],
+                    deterministic_dtype: Optional[jnp.dtype]
+                    ) -> None:
+        self.deterministic_nn = deterministic_nn
+        self.deterministic_weights = deterministic_weights
+        self.deterministic_dtype = deterministic_dtype
+
+        # Layer configs are frozen, since the layer modules (and the deterministic
+        # prefix) below are built from them once and must stay in sync with them
+        self.layer_configs = tuple(flax.core.freeze(config) for config in extract_configs(
+            deterministic_nn, probabilistic_layer_names, num_probabilistic_layers))
+
+        self._layer_modules = tuple(layer_from_config(config) for config in self.layer_configs)
+        # Track when we switch from conv to dense layers
+        self._last_conv_idx = max(
+            (i for i, c in enumerate(self.layer_configs) if c["layer_type"] == "conv"),
+            default=-1
+        )
+        # Leading deterministic layers (excluding the heads) are evaluated once,
+        # outside of the probabilistic model
+        num_body_layers = len(self.layer_configs) - self._num_head_layers
+        self._num_prefix_layers = next(
+            (i for i, c in enumerate(self.layer_configs[:num_body_layers]) if c["is_probabilistic"]),
+            num_body_layers
+        )
+        if self.deterministic_weights:
+            self._set_pretrained_priors()
+
+    def _set_pretrained_priors(self) -> None:
+        """
+        Flattens deterministic weights into per-layer parameters and into
+        a lookup table keyed by the names that random_flax_module passes to the prior
+        """
+        self._pretrained_priors = flatten_params_dict(self.deterministic_weights)
+        self._prior_locs = {
+            f"{layer_name}.{param_type}": param
+            for layer_name, layer_params in self._pretrained_priors.items()
+            for param_type, param in layer_params.items()
+        }
+        self._prefix_net, self._prefix_params = (
+            sequential_from_configs(
+                self.layer_configs[:self._num_prefix_layers], self._pretrained_priors)
+            if self._num_prefix_layers > 0 else (None, None))
+        if self._prefix_params is not None and self.deterministic_dtype is not None:
+            self._prefix_params = jax.tree_util.tree_map(
+                lambda p: p.astype(self.deterministic_dtype), self._prefix_params)
+        # Compiled once and reused for training and test data. The parameters are passed
+        # as an argument, so they are not embedded into the executable as constants
+        self._jit_prefix_apply = jax.jit(self._prefix_apply)
+
+    def _train_deterministic_nn(self,
+                                X: jnp.ndarray,
+                                y: jnp.ndarray,
+                                sgd_epochs: Optional[int] = None,
+                                sgd_lr: float = 0.01,
+                                sgd_batch_size: Optional[int] = None,
+                                sgd_wa_epochs: int = 10,
+                                map_sigma: float = 1.0
+                                ) -> None:
+        """Trains the deterministic NN and uses its weights as the pretrained priors"""
+        print("Training deterministic NN...")
+        det_nn = DeterministicNN(
+            self.deterministic_nn,
+            input_shape=X.shape[1:] if X.ndim > 2 else (X.shape[-1],),  # different input shape for ConvNet and MLP
+            loss=self._deterministic_loss, learning_rate=sgd_lr,
+            swa_epochs=sgd_wa_epochs, sigma=map_sigma)
+        det_nn.train(X, y, 500 if sgd_epochs is None else sgd_epochs, sgd_batch_size)
+        self.deterministic_weights = det_nn.state.params
+        self._set_pretrained_priors()
+        print("Training partially Bayesian NN")
+
+    def _apply_layers(self,
+                      X: jnp.ndarray,
+                      start: int,
+                      stop: int,
+                      priors_sigma: float = 1.0
+                      ) -> jnp.ndarray:
+        """
+        Passes inputs through layers [start, stop), sampling the weights of
+        probabilistic layers and using pretrained weights for deterministic ones
+        """
+        def prior(name, shape):
+            return dist.Normal(self._prior_locs[name], priors_sigma)
+
+        current_input = X
+        for idx in range(start, stop):
+            config = self.layer_configs[idx]
+            layer_name = config['layer_name']
+            layer = self._layer_modules[idx]
+
+            # Flatten inputs after last conv layer
+            if idx > self._last_conv_idx and idx-1 == self._last_conv_idx:
+                current_input = current_input.reshape((current_input.shape[0], -1))
+
+            if config['is_probabilistic']:
+                net = random_flax_module(
+                    layer_name, layer,
+                    input_shape=(1, *current_input.shape[1:]),
+                    prior=prior
+                )
+                current_input = net(current_input)
+            else:
+                params = {"params": {layer_name: self._pretrained_priors[layer_name]}}
+                current_input = layer.apply(params, current_input)
+        return current_input
+
+    def get_map_init_values(self,
+                            X: jnp.ndarray,
+                            y: jnp.ndarray,
+                            priors_sigma: float = 1.0,
+                            **kwargs) -> Dict[str, jnp.ndarray]:
+        """
+        Returns the deterministic (MAP) weights of the probabilistic layers
+        keyed by the NUTS sample site names, so that the chains start from them
+        """
+        init_values = {}
+        for config in self.layer_configs:
+            if config['is_probabilistic']:
+                layer_name = config['layer_name']
+                init_values.update(get_init_vals_dict(
+                    {layer_name: self._pretrained_priors[layer_name]}, prefix=layer_name))
+        return init_values
+
+    def deterministic_features(self, X: jnp.ndarray) -> jnp.ndarray:
+        """
+        Passes inputs through the leading deterministic layers (stacked into a single
+        module) with their pretrained weights. These layers are frozen, so their output
+        is computed once per dataset rather than at every HMC step, and the probabilistic
+        model operates directly on these features.
+        """
+        if self._prefix_net is None:
+            return X
+        return self._jit_prefix_apply(self._prefix_params, X)
+
+    def _prefix_apply(self, params: Dict, X: jnp.ndarray) -> jnp.ndarray:
+        if self.deterministic_dtype is None:
+            return self._prefix_net.apply(params, X)
+        features = self._prefix_net.apply(params, X.astype(self.deterministic_dtype))
+        return features.astype(jnp.result_type(float))
+
+    def _vmap_predict(self,
+                      X_new: jnp.ndarray,
+                      samples: Dict[str, jnp.ndarray]):
+        """
+        Passes X_new through the deterministic layers once, since their weights
+        are the same for all posterior samples, and then streams over the samples
+        """
+        return super()._vmap_predict(self.deterministic_features(X_new), samples)
+
+    def sample_from_posterior(self,
+                              rng_key: jnp.ndarray,
+                              X_new: jnp.ndarray,
+                              samples: Dict[str, jnp.ndarray],
+                              return_sites: Optional[List[str]] = None
+                              ) -> Dict[str, jnp.ndarray]:
+        return super().sample_from_posterior(
+            rng_key, self.deterministic_features(X_new), samples, return_sites)
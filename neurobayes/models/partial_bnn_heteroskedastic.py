@@ -2,18 +2,14 @@ from typing import List, Optional, Type, Dict, Tuple, Union
 import jax.numpy as jnp
 import numpyro
 import numpyro.distributions as dist
-from numpyro.contrib.module import random_flax_module
-import flax
 
 from .bnn_heteroskedastic import HeteroskedasticBNN
-from ..flax_nets import DeterministicNN
-from ..flax_nets import FlaxMLP2Head, FlaxConvNet2Head, MLPLayerModule, ConvLayerModule
-from ..flax_nets import extract_configs
-from ..utils import flatten_params_dict
+from .partial_bnn_base import PartialBNNMixin
+from ..flax_nets import FlaxMLP2Head, FlaxConvNet2Head
 
 
 
-class HeteroskedasticPartialBNN(HeteroskedasticBNN):
+class HeteroskedasticPartialBNN(PartialBNNMixin, HeteroskedasticBNN):
     """
     Heteroskedastic Partially Bayesian Neural Network
 
@@ -27,153 +23,71 @@ class HeteroskedasticPartialBNN(HeteroskedasticBNN):
             Number of layers at the end of deterministic_nn to be treated as fully stochastic ('Bayesian')
         probabilistic_layer_names:
             Names of neural network modules to be treated probabilistically
+        deterministic_dtype:
+            Optional reduced-precision dtype (e.g. jnp.bfloat16) for evaluating the leading
+            deterministic layers. Their outputs are cast back to the default float type
+            before entering the probabilistic layers. Defaults to None (full precision).
     """
 
+    # The mean and variance heads
+    _num_head_layers = 2
+    _deterministic_loss = 'heteroskedastic'
+
     def __init__(self,
                  deterministic_nn: Union[Type[FlaxMLP2Head], Type[FlaxConvNet2Head]],
                  deterministic_weights: Optional[Dict[str, jnp.ndarray]] = None,
                  num_probabilistic_layers: int = None,
                  probabilistic_layer_names: List[str] = None,
+                 deterministic_dtype: Optional[jnp.dtype] = None
                  ) -> None:
         super().__init__(None)
-
-        self.deterministic_nn = deterministic_nn
-        self.deterministic_weights = deterministic_weights
-
-        self.layer_configs = extract_configs(
-            deterministic_nn, probabilistic_layer_names, num_probabilistic_layers)
+        self._set_layers(deterministic_nn, deterministic_weights, num_probabilistic_layers,
+                         probabilistic_layer_names, deterministic_dtype)
 
     def model(self,
               X: jnp.ndarray,
               y: jnp.ndarray = None,
-              pretrained_priors: Dict = None,
               priors_sigma: float = 1.0,
               **kwargs) -> None:
-        """Heteroskedastic (partial) BNN probabilistic model"""
-
-        net = self.deterministic_nn
-        pretrained_priors = flatten_params_dict(self.deterministic_weights)
-            
-        def prior(name, shape):
-            param_path = name.split('.')
-            layer_name = param_path[0]
-            param_type = param_path[-1]  # kernel or bias
-            return dist.Normal(pretrained_priors[layer_name][param_type], priors_sigma)
-
-        current_input = X
-
-        # Track when we switch from conv to dense layers
-        last_conv_idx = max(
-            (i for i, c in enumerate(self.layer_configs) if c["layer_type"] == "conv"),
-            default=-1
-        )
-        
-        for idx, config in enumerate(self.layer_configs[:-2]):  # All but the two head layers
-            layer_name = config['layer_name']
-            
-            # Flatten inputs after last conv layer
-            if idx > last_conv_idx and idx-1 == last_conv_idx:
-                current_input = current_input.reshape((current_input.shape[0], -1))
+        """
+        Heteroskedastic (partial) BNN probabilistic model. Takes the output of
+        the leading deterministic layers (see .deterministic_features()) as its input.
+        """
 
-            layer_cls = ConvLayerModule if config["layer_type"] == "conv" else MLPLayerModule
-            layer = layer_cls(
-                features=config['features'],
-                activation=config['activation'],
-                layer_name=layer_name,
-                **({"input_dim": config['input_dim'], 
-                    "kernel_size": config['kernel_size']} if config["layer_type"] == "conv" else {})
-            )
-            
-            if config['is_probabilistic']:
-                net = random_flax_module(
-                    layer_name, layer, 
-                    input_shape=(1, *current_input.shape[1:]),
-                    prior=prior
-                )
-                current_input = net(current_input)
-            else:
-                params = {
-                    "params": {
-                        layer_name: {
-                            "kernel": pretrained_priors[layer_name]["kernel"],
-                            "bias": pretrained_priors[layer_name]["bias"]
-                        }
-                    }
-                }
-                current_input = layer.apply(params, current_input)
+        # Remaining shared layers (all but the two head layers)
+        num_layers = len(self.layer_configs)
+        shared_output = self._apply_layers(
+            X, self._num_prefix_layers, num_layers - 2, priors_sigma)
 
         # Process head layers
-        shared_output = current_input
-        
-        # Mean head
-        mean_config = self.layer_configs[-2]
-        layer_name = mean_config["layer_name"]
-        mean_layer = MLPLayerModule(
-            features=mean_config['features'],
-            activation=mean_config['activation'],
-            layer_name=layer_name
-        )
-        
-        if mean_config['is_probabilistic']:
-            net = random_flax_module(
-                layer_name, mean_layer,
-                input_shape=(1, shared_output.shape[-1]),
-                prior=prior
-            )
-            mean = net(shared_output)
-        else:
-            params = {
-                "params": {
-                    layer_name: {
-                        "kernel": pretrained_priors[layer_name]["kernel"],
-                        "bias": pretrained_priors[layer_name]["bias"]
-                    }
-                }
-            }
-            mean = mean_layer.apply(params, shared_output)
-        
-        # Variance head
-        var_config = self.layer_configs[-1]
-        layer_name = var_config["layer_name"]
-        var_layer = MLPLayerModule(
-            features=var_config['features'],
-            activation=var_config['activation'],
-            layer_name=layer_name
-        )
-        
-        if var_config['is_probabilistic']:
-            net = random_flax_module(
-                layer_name, var_layer,
-                input_shape=(1, shared_output.shape[-1]),
-                prior=prior
-            )
-            variance = net(shared_output)
-        else:
-            params = {
-                "params": {
-                    layer_name: {
-                        "kernel": pretrained_priors[layer_name]["kernel"],
-                        "bias": pretrained_priors[layer_name]["bias"]
-                    }
-                }
-            }
-            variance = var_layer.apply(params, shared_output)
+        mean = self._apply_layers(shared_output, num_layers - 2, num_layers - 1, priors_sigma)
+        variance = self._apply_layers(shared_output, num_layers - 1, num_layers, priors_sigma)
 
         # Register values with numpyro
         mu = numpyro.deterministic("mu", mean)
         sig = numpyro.deterministic("sig", variance)
 
-        # Score against the observed data points
-        numpyro.sample("y", dist.Normal(mu, sig), obs=y)
+        # Score against the observed data points (target dimensions form a single event)
+        with numpyro.plate("data", X.shape[0]):
+            numpyro.sample("y", dist.Normal(mu, sig).to_event(1), obs=y)
+
+    def _vmap_predict_noise(self,
+                            X_new: jnp.ndarray,
+                            samples: Dict[str, jnp.ndarray]
+                            ) -> jnp.ndarray:
+        return super()._vmap_predict_noise(self.deterministic_features(X_new), samples)
 
     def fit(self, X: jnp.ndarray, y: jnp.ndarray,
             num_warmup: int = 2000, num_samples: int = 2000,
-            num_chains: int = 1, chain_method: str = 'sequential',
+            num_chains: int = 1, chain_method: Optional[str] = None,
             sgd_epochs: Optional[int] = None, sgd_lr: Optional[float] = 0.01,
             sgd_batch_size: Optional[int] = None, sgd_wa_epochs: Optional[int] = 10,
             map_sigma: float = 1.0, priors_sigma: float = 1.0,
             progress_bar: bool = True, device: str = None, rng_key: Optional[jnp.array] = None,
-            extra_fields: Optional[Tuple[str]] = ()
+            extra_fields: Optional[Tuple[str]] = (),
+            map_init: bool = True, init_values: Optional[Dict[str, jnp.ndarray]] = None,
+            dense_mass: bool = False, max_tree_depth: int = 10,
+            target_accept_prob: float = 0.8, find_heuristic_step_size: bool = False
             ) -> None:
         """
         Run HMC to infer parameters of the heteroskedastic BNN
@@ -184,7 +98,11 @@ class HeteroskedasticPartialBNN(HeteroskedasticBNN):
             num_warmup: number of HMC warmup states
             num_samples: number of HMC samples
             num_chains: number of HMC chains
-            chain_method: choose between 'sequential', 'vectorized', and 'parallel'
+            chain_method:
+                choose between 'sequential', 'vectorized', 'parallel', and 'pmap_vectorized'
+                (chains split between devices and vectorized on each device). Defaults to None,
+                meaning 'vectorized' on a single GPU/TPU, 'pmap_vectorized' on multiple GPUs/TPUs,
+                'parallel' on CPU if there is a CPU device per chain, and 'sequential' otherwise
             sgd_swa_epochs:
                 number of SGD training epochs for deterministic NN
                 (if trained weights are not provided at the initialization stage)
@@ -203,18 +121,24 @@ class HeteroskedasticPartialBNN(HeteroskedasticBNN):
             extra_fields:
                 Extra fields (e.g. 'accept_prob') to collect during the HMC run.
                 The extra fields are accessible from model.mcmc.get_extra_fields() after model training.
+            map_init:
+                start the HMC chains from the deterministic (MAP) weights of the probabilistic layers
+                instead of the median of the prior samples (defaults to True). Note that all chains
+                then start from the same point.
+            init_values: initial values for the HMC chains keyed by the sample site names (takes precedence over map_init)
+            dense_mass: adapt a dense (full-rank) mass matrix instead of a diagonal one
+            max_tree_depth: maximum depth of the NUTS binary tree (defaults to 10)
+            target_accept_prob: target acceptance probability for step size adaptation (defaults to 0.8)
+            find_heuristic_step_size: search for a reasonable initial step size before the warmup
         """
+        X, y = self.set_data(X, y)
         if not self.deterministic_weights:
-            print("Training deterministic NN...")
-            X, y = self.set_data(X, y)
-            det_nn = DeterministicNN(
-                self.deterministic_nn,
-                input_shape = X.shape[1:] if X.ndim > 2 else (X.shape[-1],), # different input dims for ConvNet and MLP 
-                loss='heteroskedastic', learning_rate=sgd_lr,
-                swa_epochs=sgd_wa_epochs, sigma=map_sigma)
-            det_nn.train(X, y, 500 if sgd_epochs is None else sgd_epochs, sgd_batch_size)
-            self.deterministic_weights = det_nn.state.params
-            print("Training partially Bayesian NN")
+            self._train_deterministic_nn(
+                X, y, sgd_epochs, sgd_lr, sgd_batch_size, sgd_wa_epochs, map_sigma)
+        X = self.deterministic_features(X)
         super().fit(X, y, num_warmup, num_samples, num_chains, chain_method,
-                    priors_sigma, progress_bar, device, rng_key, extra_fields)
-
+                    priors_sigma, progress_bar, device, rng_key, extra_fields,
+                    map_init=map_init, init_values=init_values,
+                    dense_mass=dense_mass, max_tree_depth=max_tree_depth,
+                    target_accept_prob=target_accept_prob,
+                    find_heuristic_step_size=find_heuristic_step_size)
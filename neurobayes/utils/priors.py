@@ -1,8 +1,9 @@
-from typing import Callable, Dict, List
+from typing import Callable, Dict, List, Tuple
 from dataclasses import dataclass
 import numpyro
 import numpyro.distributions as dist
 import jax.numpy as jnp
+import numpy as np
 
 
 @dataclass
@@ -30,26 +31,46 @@ def sample_biases(name: str, channels: int, scale: float = 1.0) -> jnp.ndarray:
     return b
 
 
+def sample_flat_params(name: str, layer_shapes: List[Tuple[str, str, int, int]],
+                       scale: float = 1.0) -> Dict[str, jnp.ndarray]:
+    """
+    Samples the weights (Normal) and the biases (Cauchy) of all layers as two flat
+    vectors, i.e. two sample sites, '{name}weights' and '{name}biases', instead of two
+    sites per layer, and splits them into per-layer arrays.
+    layer_shapes lists (weights key, biases key, in_channels, out_channels) for each layer.
+    """
+    w_sizes = [in_channels * out_channels for _, _, in_channels, out_channels in layer_shapes]
+    b_sizes = [out_channels for _, _, _, out_channels in layer_shapes]
+    w_flat = numpyro.sample(
+        f"{name}weights", dist.Normal(0., scale).expand([sum(w_sizes)]).to_event(1))
+    b_flat = numpyro.sample(
+        f"{name}biases", dist.Cauchy(0., scale).expand([sum(b_sizes)]).to_event(1))
+    w_split = jnp.split(w_flat, np.cumsum(w_sizes)[:-1])
+    b_split = jnp.split(b_flat, np.cumsum(b_sizes)[:-1])
+    params = {}
+    for (w_key, b_key, in_channels, out_channels), w, b in zip(layer_shapes, w_split, b_split):
+        params[w_key] = w.reshape(in_channels, out_channels)
+        params[b_key] = b
+    return params
+
+
 def get_mlp_prior(input_dim: int, output_dim: int,
                   architecture: List[int], name: str = "main",
                   scale: float = 1.0
                   ) -> Callable[[], Dict[str, jnp.ndarray]]:
-    """Priors over weights and biases for a Bayesian MLP"""
+    """
+    Priors over weights and biases for a Bayesian MLP. The parameters are sampled at
+    two sites, '{name}_weights' and '{name}_biases' (previously one site per layer,
+    '{name}_w{i}' and '{name}_b{i}'); the returned dict keeps the per-layer keys.
+    """
+    channels = [input_dim, *architecture, output_dim]
+    layer_shapes = [
+        (f"{name}_w{i}", f"{name}_b{i}", in_channels, out_channels)
+        for i, (in_channels, out_channels) in enumerate(zip(channels[:-1], channels[1:]))
+    ]
+
     def mlp_prior():
-        params = {}
-        in_channels = input_dim
-        for i, out_channels in enumerate(architecture):
-            params[f"{name}_w{i}"] = sample_weights(
-                f"{name}_w{i}", in_channels, out_channels, scale)
-            params[f"{name}_b{i}"] = sample_biases(
-                f"{name}_b{i}", out_channels, scale)
-            in_channels = out_channels
-        # Output layer
-        params[f"{name}_w{len(architecture)}"] = sample_weights(
-            f"{name}_w{len(architecture)}", in_channels, output_dim, scale)
-        params[f"{name}_b{len(architecture)}"] = sample_biases(
-            f"{name}_b{len(architecture)}", output_dim, scale)
-        return params
+        return sample_flat_params(f"{name}_", layer_shapes, scale)
     return mlp_prior
 
 
@@ -57,18 +78,22 @@ def get_heteroskedastic_mlp_prior(input_dim: int, output_dim: int,
                                   architecture: List[int],
                                   scale: float = 1.0
                                   ) -> Callable[[], Dict[str, jnp.ndarray]]:
-    """Priors over weights and biases for a Bayesian MLP with heteroskedastic outputs"""
+    """
+    Priors over weights and biases for a Bayesian MLP with heteroskedastic outputs.
+    The parameters are sampled at two sites, 'weights' and 'biases' (previously one
+    site per layer, e.g. 'w0', 'b0', 'w_mean'); the returned dict keeps the per-layer keys.
+    """
+    channels = [input_dim, *architecture]
+    layer_shapes = [
+        (f"w{i}", f"b{i}", in_channels, out_channels)
+        for i, (in_channels, out_channels) in enumerate(zip(channels[:-1], channels[1:]))
+    ]
+    # Output layers for mean and variance
+    layer_shapes += [
+        ('w_mean', 'b_mean', channels[-1], output_dim),
+        ('w_variance', 'b_variance', channels[-1], output_dim)
+    ]
+
     def mlp_prior():
-        params = {}
-        in_channels = input_dim
-        for i, out_channels in enumerate(architecture):
-            params[f"w{i}"] = sample_weights(f"w{i}", in_channels, out_channels, scale)
-            params[f"b{i}"] = sample_biases(f"b{i}", out_channels, scale)
-            in_channels = out_channels
-        # Output layers for mean and variance
-        params['w_mean'] = sample_weights('w_mean', in_channels, output_dim, scale)
-        params['b_mean'] = sample_biases('b_mean', output_dim, scale)
-        params['w_variance'] = sample_weights('w_variance', in_channels, output_dim, scale)
-        params['b_variance'] = sample_biases('b_variance', output_dim, scale)
-        return params
+        return sample_flat_params("", layer_shapes, scale)
     return mlp_prior
@@ -1,7 +1,8 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Tuple, Union
 
 import jax
 import jax.numpy as jnp
+from flax import traverse_util
 
 import numpy as np
 
@@ -33,6 +34,55 @@ def infer_device(device_preference: str = None):
     return jax.devices()[0]
 
 
+def infer_chain_method(num_chains: int = 1, device_preference: str = None) -> str:
+    """
+    Selects how to run multiple MCMC chains on the device that will be used for sampling:
+    'vectorized' (all chains in a single compiled step) on accelerators, or 'pmap_vectorized'
+    if there are several accelerators to split the chains between, 'parallel' on CPU if there
+    is a separate CPU device for each chain, and 'sequential' otherwise (vectorized chains
+    are usually slower than sequential ones on a single CPU device).
+    """
+    device = infer_device(device_preference)
+    num_devices = jax.local_device_count(backend=device.platform)
+    if device.platform != "cpu":
+        if num_chains > 1 and num_devices > 1:
+            return "pmap_vectorized"
+        return "vectorized"
+    if num_chains > 1 and num_devices >= num_chains:
+        return "parallel"
+    return "sequential"
+
+
+def pmap_vectorized(num_chains: int, device_preference: str = None) -> Union[str, Callable]:
+    """
+    Returns a chain_method for numpyro MCMC that splits the chains evenly between
+    the local devices of the given type with jax.pmap and vectorizes them on each device
+    with jax.vmap. Falls back to 'vectorized' if the chains cannot be split between
+    more than one device.
+    """
+    device = infer_device(device_preference)
+    devices = jax.local_devices(backend=device.platform)
+    num_devices = max(d for d in range(1, min(len(devices), num_chains) + 1)
+                      if num_chains % d == 0)
+    if num_devices == 1:
+        return "vectorized"
+    devices = devices[:num_devices]
+
+    def chain_method(fn):
+        def split(x):
+            return x.reshape(num_devices, -1, *x.shape[1:])
+
+        def merge(x):
+            return x.reshape(-1, *x.shape[2:])
+
+        def mapped_fn(args):
+            outputs = jax.pmap(jax.vmap(fn), devices=devices)(
+                jax.tree_util.tree_map(split, args))
+            return jax.tree_util.tree_map(merge, outputs)
+        return mapped_fn
+    return chain_method
+
+
 def put_on_device(device=None, *data_items):
     """
     Places multiple data items on the specified device.
@@ -56,6 +106,65 @@ def split_in_batches(array: jnp.ndarray, batch_size: int = 200) -> List[jnp.ndar
     return [array[i * batch_size:(i + 1) * batch_size] for i in range(num_batches)]
 
 
+def map_in_batches(fn: Callable[[jnp.ndarray], Any], array: jnp.ndarray,
+                   batch_size: int = 200) -> Any:
+    """
+    Applies fn to consecutive batches of array with jax.lax.map and stitches
+    the outputs (an array or a pytree of arrays) back along the leading axis.
+    The last batch is padded by repeating the last entry, so that all batches
+    have the same shape and fn is compiled only once. If there are several local
+    devices of the same type as the one holding the array, the batches are split
+    between them with jax.pmap.
+    """
+    num_points = array.shape[0]
+    batch_size = min(batch_size, num_points)
+    num_batches = (num_points + batch_size - 1) // batch_size
+    array = jnp.asarray(array)
+    devices = jax.local_devices(backend=next(iter(array.devices())).platform)
+    num_devices = min(len(devices), num_batches)
+    batches_per_device = (num_batches + num_devices - 1) // num_devices
+    pad = num_devices * batches_per_device * batch_size - num_points
+    array = jnp.pad(array, [(0, pad)] + [(0, 0)] * (array.ndim - 1), mode="edge")
+    if num_devices > 1:
+        batches = array.reshape(
+            num_devices, batches_per_device, batch_size, *array.shape[1:])
+        outputs = jax.pmap(
+            lambda b: jax.lax.map(fn, b), devices=devices[:num_devices])(batches)
+        num_batch_dims = 3
+    else:
+        batches = array.reshape(num_batches, batch_size, *array.shape[1:])
+        outputs = jax.lax.map(fn, batches)
+        num_batch_dims = 2
+    return jax.tree_util.tree_map(
+        lambda a: a.reshape(-1, *a.shape[num_batch_dims:])[:num_points], outputs)
+
+
+def streaming_mean_and_var(fn: Callable[[Any], Any], xs: Any) -> Tuple[Any, Any]:
+    """
+    Computes the mean and (population) variance of fn(x) over the leading axis
+    of xs (an array or a pytree of arrays) in a single pass of Welford's algorithm
+    inside jax.lax.scan. The outputs of fn for individual x are never stacked,
+    so the memory footprint is that of a single fn(x) output.
+    """
+    x0 = jax.tree_util.tree_map(lambda a: a[0], xs)
+    zeros = jax.tree_util.tree_map(
+        lambda s: jnp.zeros(s.shape, s.dtype), jax.eval_shape(fn, x0))
+
+    def step(carry, x):
+        n, mean, m2 = carry
+        value = fn(x)
+        n = n + 1
+        delta = jax.tree_util.tree_map(lambda v, m: v - m, value, mean)
+        mean = jax.tree_util.tree_map(lambda m, d: m + d / n, mean, delta)
+        m2 = jax.tree_util.tree_map(
+            lambda s, d, v, m: s + d * (v - m), m2, delta, value, mean)
+        return (n, mean, m2), None
+
+    (n, mean, m2), _ = jax.lax.scan(step, (0, zeros, zeros), xs)
+    var = jax.tree_util.tree_map(lambda s: s / n, m2)
+    return mean, var
+
+
 def split_dict(data: Dict[str, jnp.ndarray], chunk_size: int
                ) -> List[Dict[str, jnp.ndarray]]:
     """Splits a dictionary of arrays into a list of smaller dictionaries.
@@ -188,23 +297,30 @@ def get_prior_means_from_samples(params_numpyro: Dict[str, jnp.ndarray]) -> Dict
     return params_all
 
 
-def get_init_vals_dict(nn_params):
+def get_init_vals_dict(nn_params, prefix='nn'):
+    """
+    Maps (nested) flax parameters onto the names of the sample sites created by
+    random_flax_module(prefix, ...), e.g. to use them as initial values for NUTS
+    """
     if jax.config.x64_enabled:
-        nn_params = jax.tree_map(promote_to_x64, nn_params)
-    nn_params_ref = {}
-    for k, layer in nn_params.items():
-        for param_name, param_vals in layer.items():
-            if param_name == 'bias':
-                nn_params_ref['nn/' + k + '.bias'] = param_vals
-            else:
-                nn_params_ref['nn/' + k + '.kernel'] = param_vals
-    return nn_params_ref
+        nn_params = jax.tree_util.tree_map(promote_to_x64, nn_params)
+    flat_params = traverse_util.flatten_dict(nn_params, sep='.')
+    return {prefix + '/' + k: v for k, v in flat_params.items()}
 
 
 def promote_to_x64(x):
     return x.astype(jnp.float64)
 
 
+def to_default_float(x):
+    """
+    Casts an array to the default JAX float type (float32, or float64 if x64 is enabled).
+    NumPy inputs are cast on the host, before they are transferred to a device.
+    """
+    dtype = jnp.result_type(float)
+    return x if x.dtype == dtype else x.astype(dtype)
+
+
 def calculate_sigma(X):
     if X.ndim == 1:
         X = X[:, None]
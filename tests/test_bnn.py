@@ -1,4 +1,7 @@
+import os
 import sys
+import subprocess
+import textwrap
 import pytest
 import numpy as onp
 import jax.numpy as jnp
@@ -19,6 +22,16 @@ def get_dummy_data(feature_dim=1, target_dim=1, squeezed=False, n_points=8):
         return X.squeeze(), y.squeeze()
     return X, y
 
+
+def run_with_host_devices(code, num_devices=2):
+    """Runs code in a fresh interpreter where the CPU is split into num_devices JAX devices"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root,
+               XLA_FLAGS=f"--xla_force_host_platform_device_count={num_devices}")
+    result = subprocess.run([sys.executable, "-c", textwrap.dedent(code)],
+                            env=env, cwd=root, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
 @pytest.mark.parametrize("n_targets", [1, 2])
 @pytest.mark.parametrize("n_features", [1, 4])
 @pytest.mark.parametrize("squeezed", [True, False])
@@ -28,6 +41,134 @@ def test_bnn_fit(n_features, n_targets, squeezed):
     bnn = BNN(net)
     bnn.fit(X, y, num_warmup=10, num_samples=10)
     assert bnn.mcmc is not None
+    assert "mu" not in bnn.get_samples()
+
+
+@pytest.mark.parametrize("dtype", [onp.float64, onp.int32])
+def test_bnn_set_data_dtype(dtype):
+    X, y = get_dummy_data(4, 1)
+    net = FlaxMLP(hidden_dims=[4, 2], target_dim=1)
+    X_, y_ = BNN(net).set_data(X.astype(dtype), y.astype(dtype))
+    assert_equal(X_.dtype, jnp.result_type(float))
+    assert_equal(y_.dtype, jnp.result_type(float))
+
+
+def test_bnn_sample_from_posterior():
+    X, y = get_dummy_data(4, 1)
+    X_test, _ = get_dummy_data(4, 1, n_points=5)
+    net = FlaxMLP(hidden_dims=[4, 2], target_dim=1)
+    bnn = BNN(net)
+    bnn.fit(X, y, num_warmup=10, num_samples=10)
+    samples = bnn.get_samples()
+    pred = bnn.sample_from_posterior(jax.random.PRNGKey(0), X_test, samples)
+    assert_equal(set(pred), {"mu", "y"})
+    assert_equal(pred["y"].shape, (10, 5, 1))
+    pred = bnn.sample_from_posterior(
+        jax.random.PRNGKey(0), X_test, samples, return_sites=["mu"])
+    assert_equal(set(pred), {"mu"})
+
+
+def test_bnn_fit_pretrained_priors():
+    X, y = get_dummy_data(4, 1)
+    net = FlaxMLP(hidden_dims=[4, 2], target_dim=1)
+    params = net.init(jax.random.PRNGKey(0), X[:1])['params']
+    bnn = BNN(net, pretrained_priors=params)
+    bnn.fit(X, y, num_warmup=10, num_samples=10)
+    assert_equal(bnn.get_samples()["nn/MLPLayerModule_0.Dense0.kernel"].shape, (10, 4, 4))
+
+
+def test_bnn_predict_reuses_compiled_function():
+    X, y = get_dummy_data(4, 1)
+    X_test, _ = get_dummy_data(4, 1, n_points=20)
+    net = FlaxMLP(hidden_dims=[4, 2], target_dim=1)
+    bnn = BNN(net)
+    bnn.fit(X, y, num_warmup=10, num_samples=10)
+    pmean1, pvar1 = bnn.predict(X_test)
+    predict_fn = bnn._jit_predict
+    pmean2, pvar2 = bnn.predict(X_test)
+    assert bnn._jit_predict is predict_fn
+    assert_array_equal(pmean1, pmean2)
+    assert_array_equal(pvar1, pvar2)
+    bnn.fit(X, y, num_warmup=10, num_samples=10)
+    bnn.predict(X_test)
+    assert bnn._jit_predict is not predict_fn
+
+
+@pytest.mark.parametrize("dense_mass", [True, False])
+def test_bnn_fit_nuts_options(dense_mass):
+    X, y = get_dummy_data(4, 1)
+    net = FlaxMLP(hidden_dims=[4, 2], target_dim=1)
+    bnn = BNN(net)
+    bnn.fit(X, y, num_warmup=10, num_samples=10, dense_mass=dense_mass,
+            max_tree_depth=5, target_accept_prob=0.9)
+    assert bnn.mcmc.sampler._dense_mass == dense_mass
+    assert bnn.mcmc.sampler._max_tree_depth == 5
+
+
+@pytest.mark.parametrize("num_chains", [1, 2])
+def test_bnn_continue_sampling(num_chains):
+    X, y = get_dummy_data(4, 1)
+    net = FlaxMLP(hidden_dims=[4, 2], target_dim=1)
+    bnn = BNN(net)
+    bnn.fit(X, y, num_warmup=10, num_samples=10, num_chains=num_chains)
+    step_size = bnn.mcmc.last_state.adapt_state.step_size
+    samples = bnn.get_samples(chain_dim=True)
+    bnn.continue_sampling(num_samples=5)
+    assert_equal(bnn.get_samples(chain_dim=True)["sig"].shape, (num_chains, 15))
+    assert_array_equal(bnn.get_samples(chain_dim=True)["sig"][:, :10], samples["sig"])
+    assert_equal(bnn.get_samples()["sig"].shape, (15 * num_chains,))
+    bnn.continue_sampling(num_samples=5)
+    assert_equal(bnn.get_samples()["sig"].shape, (20 * num_chains,))
+    assert_array_equal(bnn.mcmc.last_state.adapt_state.step_size, step_size)
+
+
+def test_bnn_fit_pmap_vectorized():
+    X, y = get_dummy_data(4, 1)
+    net = FlaxMLP(hidden_dims=[4, 2], target_dim=1)
+    bnn = BNN(net)
+    bnn.fit(X, y, num_warmup=10, num_samples=10, num_chains=2,
+            chain_method="pmap_vectorized", progress_bar=False)
+    assert_equal(bnn.get_samples(chain_dim=True)["sig"].shape, (2, 10))
+
+
+def test_bnn_fit_pmap_vectorized_multi_device():
+    run_with_host_devices("""
+        import jax
+        import numpy as onp
+        from neurobayes.models.bnn import BNN
+        from neurobayes.flax_nets import FlaxMLP
+
+        assert jax.local_device_count() == 2
+        X, y = onp.random.randn(8, 4), onp.random.randn(8, 1)
+        bnn = BNN(FlaxMLP(hidden_dims=[4, 2], target_dim=1))
+        bnn.fit(X, y, num_warmup=10, num_samples=10, num_chains=4,
+                chain_method="pmap_vectorized", progress_bar=False)
+        assert callable(bnn.mcmc.chain_method)
+        assert bnn.get_samples(chain_dim=True)["sig"].shape == (4, 10)
+        assert bnn.predict(X)[0].shape == (8, 1)
+        bnn.continue_sampling(num_samples=5, progress_bar=False)
+        assert bnn.get_samples(chain_dim=True)["sig"].shape == (4, 15)
+    """)
+
+
+@pytest.mark.parametrize("n_targets", [1, 2])
+def test_bnn_fit_map_init(n_targets):
+    X, y = get_dummy_data(4, n_targets)
+    net = FlaxMLP(hidden_dims=[4, 2], target_dim=n_targets)
+    bnn = BNN(net)
+    init_values = bnn.get_map_init_values(*bnn.set_data(X, y), num_steps=10)
+    assert "sig" in init_values
+    bnn.fit(X, y, num_warmup=10, num_samples=10, init_values=init_values)
+    assert set(init_values).issubset(bnn.get_samples())
+
+
+def test_bnn_fit_map_init_on_device():
+    X, y = get_dummy_data(4, 1)
+    net = FlaxMLP(hidden_dims=[4, 2], target_dim=1)
+    bnn = BNN(net)
+    bnn.fit(X, y, num_warmup=10, num_samples=10, map_init=True,
+            device="cpu", rng_key=jax.random.PRNGKey(1))
+    assert_equal(bnn.get_samples()["sig"].shape, (10,))
 
 
 @pytest.mark.parametrize("n_targets", [1, 2])
@@ -40,4 +181,41 @@ def test_bnn_fit_predict(n_features, n_targets):
     bnn.fit(X, y, num_warmup=10, num_samples=10)
     pmean, pvar = bnn.predict(X_test)
     assert_equal(pmean.shape, (len(X_test), n_targets))
-    assert_equal(pmean.shape, pvar.shape)
\ No newline at end of file
+    assert_equal(pmean.shape, pvar.shape)
+
+@pytest.mark.parametrize("batch_size", [3, 7, 50])
+def test_bnn_predict_in_batches(batch_size):
+    X, y = get_dummy_data(4, 2)
+    X_test, _ = get_dummy_data(4, 2, n_points=20)
+    net = FlaxMLP(hidden_dims=[4, 2], target_dim=2)
+    bnn = BNN(net)
+    bnn.fit(X, y, num_warmup=10, num_samples=10)
+    pmean, pvar = bnn.predict_in_batches(X_test, batch_size=batch_size)
+    pmean_full, pvar_full = bnn.predict(X_test)
+    assert_equal(pmean.shape, (len(X_test), 2))
+    assert_equal(pmean.shape, pvar.shape)
+    assert onp.allclose(pmean, pmean_full, atol=1e-5)
+    assert onp.allclose(pvar, pvar_full, atol=1e-5)
+
+
+@pytest.mark.parametrize("num_devices, batch_size", [(2, 3), (2, 7), (3, 5)])
+def test_bnn_predict_in_batches_multi_device(num_devices, batch_size):
+    # The number of batches (20 points) is not a multiple of the number of devices,
+    # so the last device gets edge-padded batches
+    run_with_host_devices(f"""
+        import jax
+        import numpy as onp
+        from neurobayes.models.bnn import BNN
+        from neurobayes.flax_nets import FlaxMLP
+
+        assert jax.local_device_count() == {num_devices}
+        X, y = onp.random.randn(8, 4), onp.random.randn(8, 2)
+        X_test = onp.random.randn(20, 4)
+        bnn = BNN(FlaxMLP(hidden_dims=[4, 2], target_dim=2))
+        bnn.fit(X, y, num_warmup=10, num_samples=10, progress_bar=False)
+        pmean, pvar = bnn.predict_in_batches(X_test, batch_size={batch_size})
+        pmean_full, pvar_full = bnn.predict(X_test)
+        assert pmean.shape == pvar.shape == (20, 2)
+        assert onp.allclose(pmean, pmean_full, atol=1e-5)
+        assert onp.allclose(pvar, pvar_full, atol=1e-5)
+    """, num_devices)
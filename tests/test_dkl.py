@@ -40,4 +40,14 @@ def test_dkl_fit_predict(n_features):
     dkl.fit(X, y, num_warmup=10, num_samples=10)
     pmean, pvar = dkl.predict(X_test)
     assert_equal(pmean.shape, (len(X_test),))
-    assert_equal(pmean.shape, pvar.shape)
\ No newline at end of file
+    assert_equal(pmean.shape, pvar.shape)
+
+def test_dkl_sample_from_posterior():
+    X, y = get_dummy_data(4)
+    X_test, _ = get_dummy_data(4, n_points=5)
+    net = FlaxMLP(hidden_dims=[4, 2], target_dim=2)
+    dkl = DKL(net, RBFKernel)
+    dkl.fit(X, y, num_warmup=10, num_samples=10)
+    y_sampled = dkl.sample_from_posterior(X_test, n_draws=3)
+    assert_equal(y_sampled.shape, (10, 3, len(X_test)))
+    assert not jnp.allclose(y_sampled[0], y_sampled[1])
@@ -0,0 +1,48 @@
+import sys
+import pytest
+import numpy as onp
+import jax
+import jax.numpy as jnp
+from numpy.testing import assert_equal
+
+sys.path.insert(0, "../neurobayes/")
+
+from neurobayes.models.gp import GP
+from neurobayes.models.kernels import RBFKernel
+
+
+def get_dummy_data(feature_dim=1, n_points=8):
+    X = onp.random.randn(n_points, feature_dim)
+    y = onp.random.randn(X.shape[0])
+    return X, y
+
+
+@pytest.mark.parametrize("noiseless", [True, False])
+def test_gp_predict_moments(noiseless):
+    X, y = get_dummy_data(2)
+    X_test, _ = get_dummy_data(2, n_points=5)
+    gp = GP(RBFKernel)
+    gp.fit(X, y, num_warmup=10, num_samples=10, progress_bar=False, print_summary=False)
+    pmean, pvar = gp.predict(X_test, noiseless=noiseless)
+    # Reference: moments over the stacked per-sample predictions
+    X_test = gp.set_data(X_test)
+    def predict_single(params):
+        mu, cov = gp.compute_gp_posterior(X_test, gp.X_train, gp.y_train, params, noiseless)
+        return mu, cov.diagonal()
+    mu_all, var_all = jax.vmap(predict_single)(gp.get_samples())
+    assert_equal(pmean.shape, (5,))
+    assert onp.allclose(pmean, jnp.mean(mu_all, axis=0), atol=1e-5)
+    assert onp.allclose(pvar, jnp.mean(var_all, axis=0) + jnp.var(mu_all, axis=0), atol=1e-5)
+
+
+def test_gp_predict_in_batches():
+    X, y = get_dummy_data(2)
+    X_test, _ = get_dummy_data(2, n_points=20)
+    gp = GP(RBFKernel)
+    gp.fit(X, y, num_warmup=10, num_samples=10, progress_bar=False, print_summary=False)
+    pmean, pvar = gp.predict_in_batches(X_test, batch_size=7, device="cpu")
+    pmean_full, pvar_full = gp.predict(X_test, device="cpu")
+    assert_equal(pmean.shape, (len(X_test),))
+    assert onp.allclose(pmean, pmean_full, atol=1e-5)
+    assert onp.allclose(pvar, pvar_full, atol=1e-5)
+    assert not hasattr(gp, "X") and not hasattr(gp, "y")
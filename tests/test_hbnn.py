@@ -0,0 +1,52 @@
+import sys
+import pytest
+import numpy as onp
+import jax
+import jax.numpy as jnp
+from numpy.testing import assert_equal
+
+sys.path.insert(0, "../neurobayes/")
+
+from neurobayes.models.bnn_heteroskedastic import HeteroskedasticBNN
+from neurobayes.flax_nets import FlaxMLP2Head
+
+
+def get_dummy_data(feature_dim=1, target_dim=1, n_points=8):
+    X = onp.random.randn(n_points, feature_dim)
+    y = onp.random.randn(X.shape[0], target_dim)
+    return X, y
+
+
+@pytest.mark.parametrize("pretrained", [True, False])
+@pytest.mark.parametrize("n_targets", [1, 2])
+def test_hbnn_fit_predict(n_targets, pretrained):
+    X, y = get_dummy_data(4, n_targets)
+    X_test, _ = get_dummy_data(4, n_targets, n_points=20)
+    net = FlaxMLP2Head(hidden_dims=[4, 2], target_dim=n_targets)
+    params = net.init(jax.random.PRNGKey(0), X[:1])['params'] if pretrained else None
+    hbnn = HeteroskedasticBNN(net, pretrained_priors=params)
+    hbnn.fit(X, y, num_warmup=10, num_samples=10)
+    pmean, pvar = hbnn.predict(X_test)
+    assert_equal(pmean.shape, (len(X_test), n_targets))
+    assert_equal(pmean.shape, pvar.shape)
+    assert_equal(hbnn.predict_noise(X_test).shape, (len(X_test), n_targets))
+
+
+def test_hbnn_priors_sigma():
+    X, y = get_dummy_data(4, 1)
+    net = FlaxMLP2Head(hidden_dims=[4, 2], target_dim=1)
+    hbnn = HeteroskedasticBNN(net)
+    hbnn.fit(X, y, num_warmup=10, num_samples=10, priors_sigma=1e-3)
+    weights = jnp.concatenate([v.ravel() for v in hbnn.get_samples().values()])
+    assert jnp.abs(weights).max() < 1e-2
+
+
+def test_hbnn_predict_noise_is_posterior_mean():
+    X, y = get_dummy_data(4, 1)
+    X_test, _ = get_dummy_data(4, 1, n_points=20)
+    hbnn = HeteroskedasticBNN(FlaxMLP2Head(hidden_dims=[4, 2], target_dim=1))
+    hbnn.fit(X, y, num_warmup=10, num_samples=10)
+    sig = hbnn.sample_from_posterior(
+        jax.random.PRNGKey(0), X_test, hbnn.get_samples(), return_sites=["sig"])["sig"]
+    assert_equal(sig.shape, (10, len(X_test), 1))
+    assert onp.allclose(hbnn.predict_noise(X_test), sig.mean(0), atol=1e-5)
@@ -0,0 +1,34 @@
+import sys
+import pytest
+import numpy as onp
+from numpy.testing import assert_equal
+
+sys.path.insert(0, "../neurobayes/")
+
+from neurobayes.models.partial_bnn_heteroskedastic import HeteroskedasticPartialBNN
+from neurobayes.flax_nets.mlp import FlaxMLP2Head
+from neurobayes.flax_nets.deterministic_nn import DeterministicNN
+
+
+def get_dummy_data(feature_dim=1, target_dim=1, n_points=8):
+    X = onp.random.randn(n_points, feature_dim)
+    y = onp.random.randn(X.shape[0], target_dim)
+    return X, y
+
+
+@pytest.mark.parametrize("n_targets", [1, 2])
+def test_hpbnn_fit_twice_pretrained(n_targets):
+    X, y = get_dummy_data(4, n_targets)
+    X_test, _ = get_dummy_data(4, n_targets, n_points=20)
+    net = FlaxMLP2Head(hidden_dims=[4, 2], target_dim=n_targets)
+    detnn_model = DeterministicNN(net, 4, loss='heteroskedastic')
+    detnn_model.train(X, y, epochs=10)
+    hpbnn = HeteroskedasticPartialBNN(
+        net, detnn_model.state.params, num_probabilistic_layers=1)
+    # The pretrained priors must survive being set (and the model fitted) repeatedly
+    hpbnn._set_pretrained_priors()
+    for _ in range(2):
+        hpbnn.fit(X, y, num_warmup=10, num_samples=10)
+        pmean, pvar = hpbnn.predict(X_test)
+        assert_equal(pmean.shape, (len(X_test), n_targets))
+        assert_equal(pmean.shape, pvar.shape)
@@ -45,6 +45,26 @@ def test_pbnn_fit_pretrained(n_features, n_targets, squeezed):
     assert pbnn.mcmc is not None
 
 
+@pytest.mark.parametrize("map_init, expected", [(True, "init_to_value"), (False, "init_to_median")])
+def test_pbnn_fit_map_init(map_init, expected):
+    X, y = get_dummy_data(4, 1)
+    net = FlaxMLP(hidden_dims=[4, 2], target_dim=1)
+    params = net.init(jax.random.PRNGKey(0), X[:1])['params']
+    pbnn = PartialBNN(net, params, num_probabilistic_layers=1)
+    pbnn.fit(X, y, num_warmup=10, num_samples=10, num_chains=2, map_init=map_init)
+    assert_equal(pbnn.mcmc.sampler._init_strategy.func.__name__, expected)
+    assert_equal(pbnn.get_samples(chain_dim=True)["sig"].shape, (2, 10))
+
+
+def test_pbnn_fit_init_values():
+    X, y = get_dummy_data(4, 1)
+    net = FlaxMLP(hidden_dims=[4, 2], target_dim=1)
+    params = net.init(jax.random.PRNGKey(0), X[:1])['params']
+    pbnn = PartialBNN(net, params, num_probabilistic_layers=1)
+    pbnn.fit(X, y, num_warmup=10, num_samples=10, map_init=False, init_values={"sig": 0.5})
+    assert_equal(pbnn.mcmc.sampler._init_strategy.keywords["values"], {"sig": 0.5})
+
+
 @pytest.mark.parametrize("n_targets", [1, 2])
 @pytest.mark.parametrize("n_features", [1, 4])
 def test_bnn_fit_predict(n_features, n_targets):
@@ -55,4 +75,31 @@ def test_bnn_fit_predict(n_features, n_targets):
     pbnn.fit(X, y, num_warmup=10, num_samples=10)
     pmean, pvar = pbnn.predict(X_test)
     assert_equal(pmean.shape, (len(X_test), n_targets))
-    assert_equal(pmean.shape, pvar.shape)
\ No newline at end of file
+    assert_equal(pmean.shape, pvar.shape)
+
+@pytest.mark.parametrize("num_probabilistic_layers, feature_dim", [(0, 2), (1, 4), (2, 4)])
+def test_pbnn_deterministic_features(num_probabilistic_layers, feature_dim):
+    X, y = get_dummy_data(4, 1)
+    net = FlaxMLP(hidden_dims=[4, 2], target_dim=1)
+    detnn_model = DeterministicNN(net, 4)
+    detnn_model.train(X, y, epochs=10)
+    pbnn = PartialBNN(
+        detnn_model.model, detnn_model.state.params,
+        num_probabilistic_layers=num_probabilistic_layers)
+    features = pbnn.deterministic_features(X)
+    assert_equal(features.shape, (len(X), feature_dim))
+
+
+def test_pbnn_deterministic_features_bf16():
+    X, y = get_dummy_data(4, 1)
+    net = FlaxMLP(hidden_dims=[4, 2], target_dim=1)
+    detnn_model = DeterministicNN(net, 4)
+    detnn_model.train(X, y, epochs=10)
+    features = PartialBNN(
+        detnn_model.model, detnn_model.state.params,
+        num_probabilistic_layers=0).deterministic_features(X)
+    features_bf16 = PartialBNN(
+        detnn_model.model, detnn_model.state.params, num_probabilistic_layers=0,
+        deterministic_dtype=jnp.bfloat16).deterministic_features(X)
+    assert_equal(features_bf16.dtype, features.dtype)
+    assert onp.allclose(features_bf16, features, atol=5e-2)
@@ -0,0 +1,49 @@
+import sys
+import pytest
+import jax
+import jax.numpy as jnp
+from numpyro import handlers
+from numpy.testing import assert_equal, assert_array_equal
+
+sys.path.insert(0, "../neurobayes/")
+
+from neurobayes.utils.priors import get_mlp_prior, get_heteroskedastic_mlp_prior
+
+
+def trace_prior(prior):
+    with handlers.trace() as tr:
+        params = handlers.seed(prior, jax.random.PRNGKey(0))()
+    return tr, params
+
+
+@pytest.mark.parametrize("architecture", [[], [4], [8, 4]])
+def test_mlp_prior(architecture):
+    tr, params = trace_prior(get_mlp_prior(3, 2, architecture, name="main"))
+    channels = [3, *architecture, 2]
+    # Per-layer keys and shapes are the same as for the former per-layer sample sites
+    expected = {}
+    for i, (in_channels, out_channels) in enumerate(zip(channels[:-1], channels[1:])):
+        expected[f"main_w{i}"] = (in_channels, out_channels)
+        expected[f"main_b{i}"] = (out_channels,)
+    assert_equal({k: v.shape for k, v in params.items()}, expected)
+    # ... while all of them are drawn at two flat sites
+    assert_equal(set(tr), {"main_weights", "main_biases"})
+    num_layers = len(channels) - 1
+    assert_array_equal(
+        jnp.concatenate([params[f"main_w{i}"].ravel() for i in range(num_layers)]),
+        tr["main_weights"]["value"])
+    assert_array_equal(
+        jnp.concatenate([params[f"main_b{i}"] for i in range(num_layers)]),
+        tr["main_biases"]["value"])
+
+
+def test_heteroskedastic_mlp_prior():
+    tr, params = trace_prior(get_heteroskedastic_mlp_prior(3, 2, [8, 4]))
+    expected = {"w0": (3, 8), "b0": (8,), "w1": (8, 4), "b1": (4,),
+                "w_mean": (4, 2), "b_mean": (2,),
+                "w_variance": (4, 2), "b_variance": (2,)}
+    assert_equal({k: v.shape for k, v in params.items()}, expected)
+    assert_equal(set(tr), {"weights", "biases"})
+    assert_array_equal(
+        jnp.concatenate([params[k].ravel() for k in ("w0", "w1", "w_mean", "w_variance")]),
+        tr["weights"]["value"])
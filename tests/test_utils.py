@@ -0,0 +1,51 @@
+import sys
+from collections import namedtuple
+import pytest
+
+sys.path.insert(0, "../neurobayes/")
+
+from neurobayes.utils import utils
+from neurobayes.utils.utils import infer_chain_method, pmap_vectorized
+
+
+FakeDevice = namedtuple("FakeDevice", ["platform", "id"])
+
+
+def set_fake_devices(monkeypatch, platform, num_devices):
+    devices = [FakeDevice(platform, i) for i in range(num_devices)]
+    monkeypatch.setattr(utils, "infer_device", lambda device_preference=None: devices[0])
+    monkeypatch.setattr(utils.jax, "local_device_count", lambda backend=None: num_devices)
+    monkeypatch.setattr(utils.jax, "local_devices", lambda backend=None: devices)
+
+
+@pytest.mark.parametrize(
+    "platform, num_devices, num_chains, expected",
+    [("cpu", 1, 1, "sequential"),
+     ("cpu", 1, 4, "sequential"),
+     ("cpu", 2, 4, "sequential"),
+     ("cpu", 4, 4, "parallel"),
+     ("cpu", 8, 4, "parallel"),
+     ("gpu", 1, 1, "vectorized"),
+     ("gpu", 1, 4, "vectorized"),
+     ("gpu", 2, 1, "vectorized"),
+     ("gpu", 2, 4, "pmap_vectorized"),
+     ("tpu", 8, 16, "pmap_vectorized")])
+def test_infer_chain_method(monkeypatch, platform, num_devices, num_chains, expected):
+    set_fake_devices(monkeypatch, platform, num_devices)
+    assert infer_chain_method(num_chains) == expected
+
+
+def test_infer_chain_method_default_device():
+    assert infer_chain_method(1) in ("sequential", "vectorized")
+
+
+@pytest.mark.parametrize("num_devices, num_chains", [(1, 4), (4, 1), (4, 7)])
+def test_pmap_vectorized_fallback(monkeypatch, num_devices, num_chains):
+    set_fake_devices(monkeypatch, "gpu", num_devices)
+    assert pmap_vectorized(num_chains) == "vectorized"
+
+
+@pytest.mark.parametrize("num_devices, num_chains", [(2, 4), (4, 6)])
+def test_pmap_vectorized_splits_chains(monkeypatch, num_devices, num_chains):
+    set_fake_devices(monkeypatch, "gpu", num_devices)
+    assert callable(pmap_vectorized(num_chains))